@@ -1,5 +1,7 @@
 # backend.py
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 import sqlite3
@@ -9,7 +11,8 @@ from typing import Dict, List, Literal
 from langchain.tools import tool
 from langchain.messages import SystemMessage, HumanMessage, ToolMessage
 from langgraph.graph import MessagesState, StateGraph, START, END
-from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.prebuilt import ToolNode
+from langgraph.checkpoint.sqlite import SqliteSaver
 from langchain_core.runnables import RunnableConfig
 
 # Import your LLM and DB Tools
@@ -78,37 +81,46 @@ You are an intelligent agent helping users analyze Heart Disease data.
 **Goal:** Provide the Markdown table directly.
 """
 
+# Build the system message ONCE so every request sends a byte-identical prefix.
+# Providers cache prompt prefixes (Anthropic/Gemini explicit caching, OpenAI/Groq
+# automatic prefix caching) — rebuilding the message per call defeats that.
+SYSTEM_MESSAGE = SystemMessage(content=sql_agent_prompt)
+
 # Bind tools to the model
 tools = [execute_read_query, get_data_dictionary]
-tools_by_name = {tool.name: tool for tool in tools}
 model_with_tools = llm.bind_tools(tools)
 
 # ==========================================
 # 3. LANGGRAPH NODE DEFINITIONS
 # ==========================================
 
-def llm_call(state: MessagesState):
+# Cap how much history is re-sent each turn. Without a window, every new turn
+# replays the whole conversation, so cumulative token cost grows quadratically
+# over a session.
+HISTORY_WINDOW = 10
+
+def trim_history(messages):
+    """Keeps the last HISTORY_WINDOW messages without splitting a tool exchange."""
+    if len(messages) <= HISTORY_WINDOW:
+        return messages
+    trimmed = messages[-HISTORY_WINDOW:]
+    # Never start the window on a tool result whose tool call was cut off.
+    while trimmed and isinstance(trimmed[0], ToolMessage):
+        trimmed = trimmed[1:]
+    return trimmed
+
+def llm_call(state: MessagesState, config: RunnableConfig):
     """LLM Node: Decides whether to call a tool or reply to user."""
+    # Cached static prefix first, dynamic history strictly after it.
     return {
         "messages": [
             model_with_tools.invoke(
-                [SystemMessage(content=sql_agent_prompt)] + state["messages"]
+                [SYSTEM_MESSAGE] + trim_history(state["messages"]),
+                config=config,
             )
         ]
     }
 
-def tool_node(state: MessagesState):
-    """Tool Node: Executes the tools requested by the LLM."""
-    result = []
-    last_message = state["messages"][-1]
-    
-    for tool_call in last_message.tool_calls:
-        tool = tools_by_name[tool_call["name"]]
-        observation = tool.invoke(tool_call["args"])
-        result.append(ToolMessage(content=str(observation), tool_call_id=tool_call["id"]))
-        
-    return {"messages": result}
-
 def should_continue(state: MessagesState) -> Literal["tool_node", END]:
     """Conditional Edge: Tool Loop vs End."""
     last_message = state["messages"][-1]
@@ -122,13 +134,22 @@ def should_continue(state: MessagesState) -> Literal["tool_node", END]:
 agent_builder = StateGraph(MessagesState)
 
 agent_builder.add_node("llm_call", llm_call)
-agent_builder.add_node("tool_node", tool_node)
+# Prebuilt ToolNode runs multiple tool calls from one LLM turn in parallel,
+# so a multi-tool turn costs max(tool_i) instead of sum(tool_i).
+agent_builder.add_node("tool_node", ToolNode(tools))
 
 agent_builder.add_edge(START, "llm_call")
 agent_builder.add_conditional_edges("llm_call", should_continue, ["tool_node", END])
 agent_builder.add_edge("tool_node", "llm_call")
 
-checkpointer = InMemorySaver()
+# Persist conversation state to SQLite instead of InMemorySaver:
+# survives restarts and keeps process memory bounded (InMemorySaver grows
+# forever across thread_ids). WAL keeps checkpoint writes cheap.
+CHECKPOINT_DB = "checkpoints.db"
+_checkpoint_conn = sqlite3.connect(CHECKPOINT_DB, check_same_thread=False)
+_checkpoint_conn.execute("PRAGMA journal_mode=WAL;")
+
+checkpointer = SqliteSaver(_checkpoint_conn)
 agent = agent_builder.compile(checkpointer=checkpointer)
 
 # ==========================================
@@ -165,10 +186,11 @@ def query_to_chatbot(user_message: str, config_id: int):
     return responses['messages'][-1].content
 
 @app.post("/chat", response_model=ChatResponse)
-def chat_endpoint(req: ChatRequest) -> ChatResponse:
+async def chat_endpoint(req: ChatRequest) -> ChatResponse:
     try:
-        # 1. Call the Agent
-        raw_content = query_to_chatbot(req.message, req.config_id)
+        # 1. Call the Agent (off the event loop — agent.invoke blocks on
+        #    HTTPS to the LLM + sqlite, so it must not starve other requests)
+        raw_content = await run_in_threadpool(query_to_chatbot, req.message, req.config_id)
         
         # 2. Fix the "List vs String" Error (Critical for Gemini 1.5)
         # Gemini often returns [{'type': 'text', 'text': '...'}] instead of just '...'
@@ -184,6 +206,36 @@ def chat_endpoint(req: ChatRequest) -> ChatResponse:
         print(f"❌ Error in chat_endpoint: {e}")
         return ChatResponse(response="I encountered an error processing your request.")
 
+def stream_chatbot_tokens(user_message: str, config_id: int):
+    """
+    Yields answer text chunks as the LLM produces them (token streaming).
+    """
+    config: RunnableConfig = {"configurable": {"thread_id": str(config_id)}}
+    input_messages = [HumanMessage(content=user_message)]
+
+    for token, metadata in agent.stream(
+        {"messages": input_messages}, config, stream_mode="messages"
+    ):
+        # Only forward text from the LLM node (skip tool output chunks)
+        if metadata.get("langgraph_node") != "llm_call":
+            continue
+        content = token.content
+        if isinstance(content, list):
+            content = "".join(part.get('text', '') for part in content if isinstance(part, dict))
+        if content:
+            yield str(content)
+
+@app.post("/chat/stream")
+def chat_stream_endpoint(req: ChatRequest):
+    """
+    Streaming variant of /chat: the client sees tokens at the provider's
+    time-to-first-token instead of waiting for the whole answer.
+    """
+    return StreamingResponse(
+        stream_chatbot_tokens(req.message, req.config_id),
+        media_type="text/plain",
+    )
+
 if __name__ == "__main__":
     # Run server
     uvicorn.run("backend:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -1,7 +1,27 @@
 import os
+import httpx
 from langchain_groq import ChatGroq
 from dotenv import load_dotenv
 
+# One pooled HTTP client pair for the whole process: every model call reuses
+# a keep-alive connection to the provider instead of paying TCP + TLS setup
+# per request. Both pipelines import `model` from here, so this covers the
+# per-column describe loops and the FastAPI ingest endpoints alike.
+_http_limits = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+_http_client = httpx.Client(limits=_http_limits)
+_http_async_client = httpx.AsyncClient(limits=_http_limits)
+
+# Exact-match LLM response cache: a repeated prompt (same system context +
+# same question, from any user) is answered from SQLite instead of paying a
+# full provider round-trip.
+try:
+    from langchain.globals import set_llm_cache
+    from langchain_community.cache import SQLiteCache
+    set_llm_cache(SQLiteCache(database_path=".llm_cache.db"))
+    print("✅ LLM response cache enabled (.llm_cache.db)")
+except ImportError:
+    print("⚠️ langchain cache modules unavailable; LLM responses will not be cached.")
+
 load_dotenv()
 api_key = os.getenv("GROQ_API_KEY")
 
@@ -11,7 +31,13 @@ if not api_key:
 else:
     print("Connecting to GROQ...")
     try:
-        model = ChatGroq(api_key=api_key,model_name="llama-3.1-8b-instant",temperature=0)
+        model = ChatGroq(
+            api_key=api_key,
+            model_name="llama-3.1-8b-instant",
+            temperature=0,
+            http_client=_http_client,
+            http_async_client=_http_async_client,
+        )
         print("✅ Connected to GROQ LLM.")
     except Exception as e:
         print(f"❌ Error connecting to GROQ: {e}")
@@ -1,299 +1,522 @@
-import uvicorn
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import pandas as pd
-import sqlite3
-import json
-import os
-import uuid
-import datetime
-from typing import Optional, List, Any
-from langchain_core.messages import HumanMessage
-
-# --- CONFIGURATION ---
-WORKING_DIR = "pipeline_workspace"
-KNOWLEDGE_BASE_FILE = os.path.join(WORKING_DIR, "final_records.json")
-DB_FILE = os.path.join(WORKING_DIR, "housing.db")
-
-if not os.path.exists(WORKING_DIR): os.makedirs(WORKING_DIR)
-if not os.path.exists(KNOWLEDGE_BASE_FILE): 
-    with open(KNOWLEDGE_BASE_FILE, "w") as f: json.dump({}, f)
-
-try:
-    from config import model
-except ImportError:
-    model = None
-
-app = FastAPI(title="Backend: Advanced Data Pipeline")
-
-# --- DATABASE INIT ---
-def initialize_database():
-    if os.path.exists(DB_FILE): return
-    csv_source = "housing.csv"
-    if os.path.exists(csv_source):
-        try:
-            df = pd.read_csv(csv_source)
-            conn = sqlite3.connect(DB_FILE)
-            df.to_sql("housing", conn, if_exists="replace", index=False)
-            conn.close()
-            print(f"🎉 Created '{DB_FILE}' from CSV.")
-        except Exception as e:
-            print(f"❌ Error converting CSV: {e}")
-
-initialize_database()
-
-# --- AUTO-GENERATE CONTEXT ON STARTUP ---
-def auto_generate_context():
-    """Automatically generate context if knowledge base is empty"""
-    if os.path.exists(KNOWLEDGE_BASE_FILE):
-        with open(KNOWLEDGE_BASE_FILE, "r") as f:
-            kb = json.load(f)
-            if kb:  # If knowledge base already has data, skip
-                print("✅ Knowledge base already populated.")
-                return
-    
-    # Generate context
-    print("📚 Generating database context...")
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query("SELECT * FROM housing", conn)
-        
-        # Get column information
-        column_info = {}
-        for col in df.columns:
-            col_data = {
-                "type": str(df[col].dtype),
-                "sample_values": df[col].dropna().head(3).tolist()
-            }
-            
-            if df[col].dtype in ['int64', 'float64']:
-                col_data["min"] = float(df[col].min())
-                col_data["max"] = float(df[col].max())
-                col_data["mean"] = float(df[col].mean())
-            
-            if df[col].dtype == 'object' or df[col].nunique() < 20:
-                col_data["unique_values"] = df[col].unique().tolist()
-                col_data["unique_count"] = int(df[col].nunique())
-            
-            column_info[col] = col_data
-        
-        conn.close()
-        
-        record = {
-            "source": "housing",
-            "total_rows": len(df),
-            "columns": list(df.columns),
-            "column_details": column_info,
-            "sample_data": df.head(5).to_dict(orient="records"),
-            "description": "California Housing dataset with location, property features, and median house values.",
-            "ingested_at": str(datetime.datetime.now())
-        }
-        
-        with open(KNOWLEDGE_BASE_FILE, "w") as f:
-            json.dump({"auto_generated": record}, f, indent=4)
-        
-        print("✅ Context generated successfully!")
-    except Exception as e:
-        print(f"❌ Error generating context: {e}")
-
-auto_generate_context()
-
-# --- CONTEXT GENERATION ---
-class DbIngestRequest(BaseModel):
-    connection_string: str = DB_FILE
-    target_name: str = "housing"
-
-@app.post("/ingest/generate_context")
-async def ingest_and_analyze(request: DbIngestRequest):
-    try:
-        conn = sqlite3.connect(request.connection_string)
-        
-        # Get total rows
-        total_rows = pd.read_sql_query(f"SELECT COUNT(*) FROM {request.target_name}", conn).iloc[0,0]
-        
-        # Get full dataframe for analysis
-        df = pd.read_sql_query(f"SELECT * FROM {request.target_name}", conn)
-        
-        # Get column information with types and sample values
-        column_info = {}
-        for col in df.columns:
-            col_data = {
-                "type": str(df[col].dtype),
-                "sample_values": df[col].dropna().head(3).tolist()
-            }
-            
-            # Add statistics for numeric columns
-            if df[col].dtype in ['int64', 'float64']:
-                col_data["min"] = float(df[col].min())
-                col_data["max"] = float(df[col].max())
-                col_data["mean"] = float(df[col].mean())
-            
-            # Add unique values for categorical columns (if reasonable count)
-            if df[col].dtype == 'object' or df[col].nunique() < 20:
-                col_data["unique_values"] = df[col].unique().tolist()
-                col_data["unique_count"] = int(df[col].nunique())
-            
-            column_info[col] = col_data
-        
-        conn.close()
-
-        record_id = str(uuid.uuid4())[:8]
-        record = {
-            "source": request.target_name,
-            "total_rows": int(total_rows),
-            "columns": list(df.columns),
-            "column_details": column_info,
-            "sample_data": df.head(5).to_dict(orient="records"),
-            "description": "California Housing dataset with location, property features, and median house values.",
-            "ingested_at": str(datetime.datetime.now())
-        }
-
-        with open(KNOWLEDGE_BASE_FILE, "r+") as f:
-            kb = json.load(f)
-            kb[record_id] = record
-            f.seek(0)
-            json.dump(kb, f, indent=4)
-            f.truncate()
-
-        return {"status": "Context Generated", "id": record_id, "record": record}
-    except Exception as e:
-        raise HTTPException(500, detail=str(e))
-
-# --- TOOL 1: SEARCH (Fully Optional Params) ---
-class HousingQuery(BaseModel):
-    ocean_proximity: Optional[str] = None
-    min_price: Optional[float] = None
-    max_price: Optional[float] = None
-    min_bedrooms: Optional[float] = None
-    max_bedrooms: Optional[float] = None
-    limit: Optional[int] = 5
-    sort_by: Optional[str] = "median_house_value"
-    sort_order: Optional[str] = "ASC"
-
-@app.post("/tools/housing_query")
-async def query_housing_data(params: HousingQuery):
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        query = "SELECT * FROM housing WHERE 1=1"
-        args = []
-
-        if params.ocean_proximity:
-            query += " AND ocean_proximity = ?"
-            args.append(params.ocean_proximity)
-        if params.min_price:
-            query += " AND median_house_value >= ?"
-            args.append(params.min_price)
-        if params.max_price:
-            query += " AND median_house_value <= ?"
-            args.append(params.max_price)
-        if params.min_bedrooms:
-            query += " AND total_bedrooms >= ?"
-            args.append(params.min_bedrooms)
-        if params.max_bedrooms:
-            query += " AND total_bedrooms <= ?"
-            args.append(params.max_bedrooms)
-
-        sort_col = params.sort_by if params.sort_by else "median_house_value"
-        order = "DESC" if params.sort_order and params.sort_order.upper() == "DESC" else "ASC"
-        limit = params.limit if params.limit else 5
-        
-        query += f" ORDER BY {sort_col} {order} LIMIT {limit}"
-        
-        df = pd.read_sql_query(query, conn, params=args)
-        conn.close()
-        
-        result = df.to_dict(orient="records")
-        return {
-            "result": result,
-            "count": len(result),
-            "query_params": params.dict()
-        }
-    except Exception as e:
-        return {"result": [], "error": str(e)}
-
-# --- TOOL 2: STATISTICS (Fully Optional Params) ---
-class StatsQuery(BaseModel):
-    group_by: Optional[str] = "ocean_proximity"
-    target_col: Optional[str] = "median_house_value"
-    agg_type: Optional[str] = "AVG"
-
-@app.post("/tools/housing_stats")
-async def query_housing_stats(params: StatsQuery):
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        
-        # Defaults if missing
-        g_by = params.group_by if params.group_by else "ocean_proximity"
-        t_col = params.target_col if params.target_col else "median_house_value"
-        agg = params.agg_type if params.agg_type else "AVG"
-
-        # Map 'average' -> 'AVG', handle case-insensitive
-        agg_map = {
-            "average": "AVG", 
-            "mean": "AVG", 
-            "avg": "AVG", 
-            "sum": "SUM", 
-            "count": "COUNT", 
-            "min": "MIN", 
-            "max": "MAX"
-        }
-        sql_agg = agg_map.get(agg.lower(), "AVG")
-
-        # Construct query
-        query = f"SELECT {g_by}, {sql_agg}({t_col}) as value FROM housing GROUP BY {g_by} ORDER BY value DESC"
-        
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        result = df.to_dict(orient="records")
-        
-        return {
-            "result": result,
-            "query_params": {
-                "group_by": g_by,
-                "target_col": t_col,
-                "agg_type": sql_agg
-            },
-            "count": len(result)
-        }
-    except Exception as e:
-        return {"result": [], "error": str(e)}
-
-# --- ADDITIONAL ENDPOINT: Get Database Schema ---
-@app.get("/schema")
-async def get_schema():
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA table_info(housing)")
-        columns = cursor.fetchall()
-        conn.close()
-        
-        schema = [
-            {
-                "name": col[1],
-                "type": col[2],
-                "nullable": not col[3],
-                "primary_key": bool(col[5])
-            }
-            for col in columns
-        ]
-        
-        return {"table": "housing", "columns": schema}
-    except Exception as e:
-        raise HTTPException(500, detail=str(e))
-
-# --- HEALTH CHECK ---
-@app.get("/health")
-async def health_check():
-    db_exists = os.path.exists(DB_FILE)
-    kb_exists = os.path.exists(KNOWLEDGE_BASE_FILE)
-    
-    return {
-        "status": "healthy" if db_exists and kb_exists else "degraded",
-        "database": "connected" if db_exists else "missing",
-        "knowledge_base": "loaded" if kb_exists else "missing"
-    }
-
-if __name__ == "__main__":
+import uvicorn
+from fastapi import FastAPI, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+import csv
+import itertools
+import sqlite3
+import orjson
+import os
+import queue
+import uuid
+import datetime
+from functools import lru_cache
+from typing import Optional, List, Any
+from filelock import FileLock
+from langchain_core.messages import HumanMessage
+
+# --- CONFIGURATION ---
+WORKING_DIR = "pipeline_workspace"
+KNOWLEDGE_BASE_FILE = os.path.join(WORKING_DIR, "final_records.json")
+DB_FILE = os.path.join(WORKING_DIR, "housing.db")
+
+if not os.path.exists(WORKING_DIR): os.makedirs(WORKING_DIR)
+if not os.path.exists(KNOWLEDGE_BASE_FILE): 
+    with open(KNOWLEDGE_BASE_FILE, "wb") as f: f.write(orjson.dumps({}))
+
+try:
+    from config import model
+except ImportError:
+    model = None
+
+# ORJSONResponse: tool results serialize through orjson instead of stdlib json
+app = FastAPI(title="Backend: Advanced Data Pipeline", default_response_class=ORJSONResponse)
+
+# --- SQL-SIDE TABLE PROFILING ---
+_NUMERIC_AFFINITIES = ("INT", "REAL", "FLOA", "DOUB", "NUM", "DEC")
+
+def _is_numeric_decl(decl_type: str) -> bool:
+    decl = (decl_type or "").upper()
+    return any(marker in decl for marker in _NUMERIC_AFFINITIES)
+
+def profile_table(conn: sqlite3.Connection, table_name: str) -> dict:
+    """
+    Profiles a table inside SQLite so only O(columns) values cross the
+    SQLite→Python boundary, instead of materializing every row in pandas.
+    Returns {total_rows, columns, column_details, sample_data}.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"PRAGMA table_info({table_name})")
+    schema = [(row[1], row[2]) for row in cursor.fetchall()]  # (name, declared type)
+    if not schema:
+        raise ValueError(f"Table '{table_name}' not found.")
+
+    total_rows = cursor.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+
+    # One aggregation pass computes min/max/mean for every numeric column
+    numeric_cols = [name for name, decl in schema if _is_numeric_decl(decl)]
+    stats = {}
+    if numeric_cols:
+        select_parts = ", ".join(
+            f'MIN("{col}"), MAX("{col}"), AVG("{col}")' for col in numeric_cols
+        )
+        row = cursor.execute(f"SELECT {select_parts} FROM {table_name}").fetchone()
+        for i, col in enumerate(numeric_cols):
+            stats[col] = row[3 * i:3 * i + 3]
+
+    column_info = {}
+    for name, decl in schema:
+        col_data = {
+            "type": decl or "TEXT",
+            "sample_values": [r[0] for r in cursor.execute(
+                f'SELECT "{name}" FROM {table_name} WHERE "{name}" IS NOT NULL LIMIT 3'
+            )],
+        }
+
+        if name in stats and stats[name][0] is not None:
+            col_min, col_max, col_mean = stats[name]
+            col_data["min"] = float(col_min)
+            col_data["max"] = float(col_max)
+            col_data["mean"] = float(col_mean)
+
+        # Low-cardinality columns: fetch up to 20 distinct values and
+        # short-circuit if the 20-cap is hit on a numeric column
+        distinct = [r[0] for r in cursor.execute(
+            f'SELECT DISTINCT "{name}" FROM {table_name} LIMIT 20'
+        )]
+        if name not in stats or len(distinct) < 20:
+            if len(distinct) < 20:
+                col_data["unique_values"] = distinct
+                col_data["unique_count"] = len(distinct)
+            else:
+                col_data["unique_values"] = distinct
+                col_data["unique_count"] = cursor.execute(
+                    f'SELECT COUNT(DISTINCT "{name}") FROM {table_name}'
+                ).fetchone()[0]
+
+        column_info[name] = col_data
+
+    col_names = [name for name, _ in schema]
+    sample_data = [
+        dict(zip(col_names, row))
+        for row in cursor.execute(f"SELECT * FROM {table_name} LIMIT 5")
+    ]
+
+    return {
+        "total_rows": int(total_rows),
+        "columns": col_names,
+        "column_details": column_info,
+        "sample_data": sample_data,
+    }
+
+# --- DATABASE INIT ---
+def _sniff_sqlite_type(value: str) -> str:
+    """Maps a sample CSV value to a SQLite column type."""
+    try:
+        int(value)
+        return "INTEGER"
+    except ValueError:
+        pass
+    try:
+        float(value)
+        return "REAL"
+    except ValueError:
+        return "TEXT"
+
+def _housing_table_ready() -> bool:
+    """True only when the DB file exists AND the housing table is queryable
+    (a bare file-existence check passes on the empty file a crashed or
+    racing worker may have left behind)."""
+    if not os.path.exists(DB_FILE):
+        return False
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        conn.execute("SELECT 1 FROM housing LIMIT 1")
+        conn.close()
+        return True
+    except sqlite3.Error:
+        return False
+
+def initialize_database():
+    if _housing_table_ready(): return
+    csv_source = "housing.csv"
+    if os.path.exists(csv_source):
+        # Serialize workers racing to build the DB (uvicorn --workers N runs
+        # this once per process); losers find the table ready and return.
+        with FileLock(DB_FILE + ".lock", timeout=30):
+            if _housing_table_ready(): return
+            _build_database(csv_source)
+
+def _build_database(csv_source: str):
+    try:
+        conn = sqlite3.connect(DB_FILE)
+        # WAL + NORMAL sync makes bulk insert ~2-3x faster and safe enough
+        # for a build step that can simply be re-run.
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        # Stream the CSV straight into executemany: no DataFrame, so peak
+        # memory stays flat regardless of file size. Column types are
+        # sniffed from the first data row so numeric columns keep their
+        # affinity (profiling and ORDER BY rely on it). Empty cells
+        # become NULLs. One transaction batches every insert.
+        with open(csv_source, newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            first_row = next(reader)
+            col_defs = ", ".join(
+                f"{name} {_sniff_sqlite_type(value)}"
+                for name, value in zip(header, first_row)
+            )
+            insert_sql = f"INSERT INTO housing VALUES ({','.join('?' * len(header))})"
+            with conn:
+                conn.execute("DROP TABLE IF EXISTS housing")
+                conn.execute(f"CREATE TABLE housing ({col_defs})")
+                conn.executemany(
+                    insert_sql,
+                    (
+                        tuple(v if v != "" else None for v in row)
+                        for row in itertools.chain([first_row], reader)
+                    ),
+                )
+        # Indexes for the /tools/housing_query hot path: filters on
+        # ocean_proximity + median_house_value ranges with ORDER BY ...
+        # LIMIT become index range scans instead of full scan + sort.
+        with conn:
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_housing_op_mhv ON housing(ocean_proximity, median_house_value);")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_housing_mhv ON housing(median_house_value);")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_housing_mi ON housing(median_income);")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_housing_age ON housing(housing_median_age);")
+            conn.execute("ANALYZE housing;")
+        conn.close()
+        print(f"🎉 Created '{DB_FILE}' from CSV.")
+    except Exception as e:
+        print(f"❌ Error converting CSV: {e}")
+
+initialize_database()
+
+# --- CONNECTION POOL ---
+class SQLiteConnectionPool:
+    """
+    Fixed-size pool of pre-configured connections. Opening sqlite3.connect()
+    per request re-reads the file header and starts with a cold page cache;
+    pooled connections keep their cache warm across requests.
+    """
+    def __init__(self, db_path: str, size: int):
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(size):
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA cache_size=-32000;")      # 32 MB page cache
+            conn.execute("PRAGMA mmap_size=268435456;")    # 256 MB mmap
+            conn.execute("PRAGMA temp_store=MEMORY;")
+            self._pool.put(conn)
+
+    def acquire(self) -> sqlite3.Connection:
+        return self._pool.get()
+
+    def release(self, conn: sqlite3.Connection):
+        self._pool.put(conn)
+
+pool = SQLiteConnectionPool(DB_FILE, size=2 * (os.cpu_count() or 2))
+
+def get_conn():
+    """FastAPI dependency: borrow a pooled connection for one request."""
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+def _load_allowed_columns() -> frozenset:
+    """Read the real housing schema once so identifier checks can't drift."""
+    conn = pool.acquire()
+    try:
+        return frozenset(
+            row[1] for row in conn.execute("PRAGMA table_info(housing)")
+        )
+    finally:
+        pool.release(conn)
+
+ALLOWED_COLUMNS = _load_allowed_columns()
+
+# Map 'average' -> 'AVG' etc., case-insensitive
+AGG_FUNCS = {
+    "average": "AVG",
+    "mean": "AVG",
+    "avg": "AVG",
+    "sum": "SUM",
+    "count": "COUNT",
+    "min": "MIN",
+    "max": "MAX",
+    "median": "MEDIAN",  # handled via window functions in housing_stats
+}
+
+# --- AUTO-GENERATE CONTEXT ON STARTUP ---
+def auto_generate_context():
+    """Automatically generate context if knowledge base is empty"""
+    if os.path.exists(KNOWLEDGE_BASE_FILE):
+        with open(KNOWLEDGE_BASE_FILE, "rb") as f:
+            kb = orjson.loads(f.read())
+            if kb:  # If knowledge base already has data, skip
+                print("✅ Knowledge base already populated.")
+                return
+    
+    # Generate context (profiling happens inside SQLite — no full-table scan in pandas)
+    print("📚 Generating database context...")
+    try:
+        conn = pool.acquire()
+        try:
+            profile = profile_table(conn, "housing")
+        finally:
+            pool.release(conn)
+
+        record = {
+            "source": "housing",
+            **profile,
+            "description": "California Housing dataset with location, property features, and median house values.",
+            "ingested_at": str(datetime.datetime.now())
+        }
+        
+        with open(KNOWLEDGE_BASE_FILE, "wb") as f:
+            f.write(orjson.dumps({"auto_generated": record}))
+
+        print("✅ Context generated successfully!")
+    except Exception as e:
+        print(f"❌ Error generating context: {e}")
+
+auto_generate_context()
+
+# --- CONTEXT GENERATION ---
+class DbIngestRequest(BaseModel):
+    connection_string: str = DB_FILE
+    target_name: str = "housing"
+
+@app.post("/ingest/generate_context")
+async def ingest_and_analyze(request: DbIngestRequest):
+    try:
+        # Counts, min/max/mean and distinct values are all computed by SQLite,
+        # so ingest cost no longer scales with pulling every row into pandas.
+        if request.connection_string == DB_FILE:
+            conn = pool.acquire()
+            try:
+                profile = await run_in_threadpool(profile_table, conn, request.target_name)
+            finally:
+                pool.release(conn)
+        else:
+            # Connect and profile on the same worker thread: a connection
+            # created here on the event-loop thread (check_same_thread=True
+            # by default) can't be used from the threadpool.
+            def _profile_external() -> dict:
+                ext_conn = sqlite3.connect(request.connection_string)
+                try:
+                    return profile_table(ext_conn, request.target_name)
+                finally:
+                    ext_conn.close()
+
+            profile = await run_in_threadpool(_profile_external)
+
+        record_id = str(uuid.uuid4())[:8]
+        record = {
+            "source": request.target_name,
+            **profile,
+            "description": "California Housing dataset with location, property features, and median house values.",
+            "ingested_at": str(datetime.datetime.now())
+        }
+
+        with open(KNOWLEDGE_BASE_FILE, "rb") as f:
+            kb = orjson.loads(f.read())
+        kb[record_id] = record
+        # Atomic rewrite: a crash mid-dump must not corrupt the knowledge base
+        tmp_path = KNOWLEDGE_BASE_FILE + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps(kb))
+        os.replace(tmp_path, KNOWLEDGE_BASE_FILE)
+
+        return {"status": "Context Generated", "id": record_id, "record": record}
+    except Exception as e:
+        raise HTTPException(500, detail=str(e))
+
+# --- TOOL 1: SEARCH (Fully Optional Params) ---
+class HousingQuery(BaseModel):
+    ocean_proximity: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_bedrooms: Optional[float] = None
+    max_bedrooms: Optional[float] = None
+    limit: Optional[int] = 5
+    sort_by: Optional[str] = "median_house_value"
+    sort_order: Optional[str] = "ASC"
+
+def _run_query(conn: sqlite3.Connection, query: str, args: list = ()) -> List[dict]:
+    """Executes a read query and zips column names onto the rows."""
+    cursor = conn.execute(query, args)
+    cols = [d[0] for d in cursor.description]
+    return [dict(zip(cols, row)) for row in cursor.fetchall()]
+
+_FILTER_CLAUSES = (
+    ("ocean_proximity", " AND ocean_proximity = ?"),
+    ("min_price", " AND median_house_value >= ?"),
+    ("max_price", " AND median_house_value <= ?"),
+    ("min_bedrooms", " AND total_bedrooms >= ?"),
+    ("max_bedrooms", " AND total_bedrooms <= ?"),
+)
+
+@lru_cache(maxsize=64)
+def _housing_query_sql(filter_flags: tuple, sort_col: str, order: str) -> str:
+    """
+    One SQL string per (filter combination, sort) shape. Identical shapes
+    produce byte-identical SQL, so sqlite3's per-connection prepared-
+    statement cache skips re-parsing the query on repeat requests.
+    """
+    query = "SELECT * FROM housing WHERE 1=1"
+    for flag, (_, clause) in zip(filter_flags, _FILTER_CLAUSES):
+        if flag:
+            query += clause
+    return query + f" ORDER BY {sort_col} {order} LIMIT ?"
+
+@app.post("/tools/housing_query")
+async def query_housing_data(params: HousingQuery, conn: sqlite3.Connection = Depends(get_conn)):
+    try:
+        values = [getattr(params, field) for field, _ in _FILTER_CLAUSES]
+        args = [v for v in values if v]
+
+        # Interpolated identifiers must come from the actual schema
+        sort_col = params.sort_by if params.sort_by in ALLOWED_COLUMNS else "median_house_value"
+        order = "DESC" if params.sort_order and params.sort_order.upper() == "DESC" else "ASC"
+        args.append(params.limit if params.limit else 5)
+
+        query = _housing_query_sql(tuple(bool(v) for v in values), sort_col, order)
+
+        # Raw cursor instead of pandas: for a handful of rows the DataFrame
+        # build (dtype inference, BlockManager) costs more than the query.
+        # Executed in the threadpool so the event loop never blocks on I/O.
+        result = await run_in_threadpool(_run_query, conn, query, args)
+        return {
+            "result": result,
+            "count": len(result),
+            "query_params": params.dict()
+        }
+    except Exception as e:
+        return {"result": [], "error": str(e)}
+
+# --- TOOL 2: STATISTICS (Fully Optional Params) ---
+class StatsQuery(BaseModel):
+    group_by: Optional[str] = "ocean_proximity"
+    target_col: Optional[str] = "median_house_value"
+    agg_type: Optional[str] = "AVG"
+
+@app.post("/tools/housing_stats")
+async def query_housing_stats(params: StatsQuery, conn: sqlite3.Connection = Depends(get_conn)):
+    try:
+        # Defaults if missing or not a real column (identifiers are
+        # interpolated into SQL, so they must come from the schema set)
+        g_by = params.group_by if params.group_by in ALLOWED_COLUMNS else "ocean_proximity"
+        t_col = params.target_col if params.target_col in ALLOWED_COLUMNS else "median_house_value"
+        agg = params.agg_type if params.agg_type else "AVG"
+        sql_agg = AGG_FUNCS.get(agg.lower(), "AVG")
+
+        # Construct query. Median has no built-in SQLite aggregate, so it is
+        # computed with window functions (row_number over each group, then
+        # averaging the one or two middle rows) — still entirely inside
+        # SQLite's C path, no rows bounced through Python.
+        if sql_agg == "MEDIAN":
+            query = (
+                f"SELECT g AS {g_by}, AVG(v) AS value FROM ("
+                f"  SELECT {g_by} AS g, {t_col} AS v,"
+                f"         ROW_NUMBER() OVER (PARTITION BY {g_by} ORDER BY {t_col}) AS rn,"
+                f"         COUNT(*) OVER (PARTITION BY {g_by}) AS cnt"
+                f"  FROM housing"
+                f") WHERE rn IN ((cnt + 1) / 2, (cnt + 2) / 2) "
+                f"GROUP BY g ORDER BY value DESC"
+            )
+        else:
+            query = f"SELECT {g_by}, {sql_agg}({t_col}) as value FROM housing GROUP BY {g_by} ORDER BY value DESC"
+
+        result = await run_in_threadpool(_run_query, conn, query)
+        
+        return {
+            "result": result,
+            "query_params": {
+                "group_by": g_by,
+                "target_col": t_col,
+                "agg_type": sql_agg
+            },
+            "count": len(result)
+        }
+    except Exception as e:
+        return {"result": [], "error": str(e)}
+
+@app.post("/tools/housing_stats/all")
+async def query_housing_stats_all(params: StatsQuery, conn: sqlite3.Connection = Depends(get_conn)):
+    """
+    All standard aggregates per group in ONE scan. A dashboard that needs
+    avg+count+sum used to call /tools/housing_stats three times — three
+    full group-by passes over the table; here SQLite shares the grouping
+    state across all five aggregates. agg_type is ignored.
+    """
+    try:
+        g_by = params.group_by if params.group_by in ALLOWED_COLUMNS else "ocean_proximity"
+        t_col = params.target_col if params.target_col in ALLOWED_COLUMNS else "median_house_value"
+
+        query = (
+            f"SELECT {g_by},"
+            f" AVG({t_col}) AS avg,"
+            f" COUNT({t_col}) AS count,"
+            f" SUM({t_col}) AS sum,"
+            f" MIN({t_col}) AS min,"
+            f" MAX({t_col}) AS max"
+            f" FROM housing GROUP BY {g_by} ORDER BY avg DESC"
+        )
+
+        result = await run_in_threadpool(_run_query, conn, query)
+
+        return {
+            "result": result,
+            "query_params": {"group_by": g_by, "target_col": t_col},
+            "count": len(result)
+        }
+    except Exception as e:
+        return {"result": [], "error": str(e)}
+
+# --- ADDITIONAL ENDPOINT: Get Database Schema ---
+@lru_cache(maxsize=4)
+def _schema_for_mtime(mtime_ns: int) -> List[dict]:
+    """Schema keyed by DB file mtime: re-read only when the file is rewritten."""
+    conn = pool.acquire()
+    try:
+        columns = conn.execute("PRAGMA table_info(housing)").fetchall()
+    finally:
+        pool.release(conn)
+    return [
+        {
+            "name": col[1],
+            "type": col[2],
+            "nullable": not col[3],
+            "primary_key": bool(col[5])
+        }
+        for col in columns
+    ]
+
+@app.get("/schema")
+async def get_schema():
+    try:
+        schema = _schema_for_mtime(os.stat(DB_FILE).st_mtime_ns)
+        return {"table": "housing", "columns": schema}
+    except Exception as e:
+        raise HTTPException(500, detail=str(e))
+
+# --- HEALTH CHECK ---
+@app.get("/health")
+async def health_check():
+    db_exists = os.path.exists(DB_FILE)
+    kb_exists = os.path.exists(KNOWLEDGE_BASE_FILE)
+    
+    return {
+        "status": "healthy" if db_exists and kb_exists else "degraded",
+        "database": "connected" if db_exists else "missing",
+        "knowledge_base": "loaded" if kb_exists else "missing"
+    }
+
+if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
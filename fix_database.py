@@ -15,10 +15,17 @@ else:
     df = pd.read_csv(csv_file)
     print(f"   Found {len(df)} rows.")
 
-    # 4. Save to SQLite
+    # 4. Save to SQLite — multi-row INSERTs inside one transaction, with WAL
+    # and relaxed fsync, instead of to_sql's default row-at-a-time commits.
     conn = sqlite3.connect(db_file)
-    df.to_sql("housing", conn, if_exists="replace", index=False)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    with conn:
+        # Keep rows-per-INSERT under SQLite's bound-variable limit
+        # (SQLITE_MAX_VARIABLE_NUMBER, 32766 stock — but 999 on older builds)
+        df.to_sql("housing", conn, if_exists="replace", index=False,
+                  method="multi", chunksize=max(1, 900 // len(df.columns)))
     conn.close()
-    
+
     print(f"✅ Success! Copied data from CSV -> '{db_file}' (Table: 'housing')")
     print("👉 You can now run the API request.")
\ No newline at end of file
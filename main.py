@@ -1,8 +1,11 @@
+import json
 import os
+from pathlib import Path
 from backend import get_sql_agent, get_joke_chain, get_router_chain
-from tools_db import get_all_tables, get_columns, get_sample_rows
+from tools_db import introspect_schema
 
 db_path = "heart.db"
+CONTEXT_CACHE = Path("schema_context.cache.json")
 
 # 1. Build Schema Context
 print("--- LOADING SYSTEM ---")
@@ -10,15 +13,32 @@ if not os.path.exists(db_path):
     print(f"❌ Error: {db_path} missing.")
     exit()
 
-tables = get_all_tables(db_path)
-schema_info = []
+# Schema context is cached on disk keyed by the DB file's mtime+size, so
+# startup is one file read instead of per-table SQLite round-trips; the
+# cache rebuilds itself whenever the database file changes.
+cache_key = f"{os.path.getmtime(db_path)}-{os.path.getsize(db_path)}"
+tables = schema_context = None
+if CONTEXT_CACHE.exists():
+    try:
+        cached = json.loads(CONTEXT_CACHE.read_text())
+        if cached.get("key") == cache_key:
+            tables = cached["tables"]
+            schema_context = cached["context"]
+    except (ValueError, KeyError):
+        pass  # stale or corrupt cache — rebuild below
 
-for table in tables:
-    cols = get_columns(db_path, table)
-    samples = get_sample_rows(db_path, table, n=1)
-    schema_info.append(f"Table: {table}\nColumns: {cols}\nSample Row: {samples}")
+if schema_context is None:
+    # One introspection pass over one connection instead of 2N+1 helper calls
+    schema = introspect_schema(db_path, sample_n=1)
+    tables = [table for table, _, _ in schema]
+    schema_context = "\n".join(
+        f"Table: {table}\nColumns: {cols}\nSample Row: {samples}"
+        for table, cols, samples in schema
+    )
+    CONTEXT_CACHE.write_text(
+        json.dumps({"key": cache_key, "tables": tables, "context": schema_context})
+    )
 
-schema_context = "\n".join(schema_info)
 print(f"✅ Schema Loaded: {tables}")
 
 # 2. Init Agents
@@ -2,9 +2,13 @@ import sqlite3
 import pandas as pd
 import json
 import sys
+import threading
 import uvicorn
+from functools import lru_cache
 from typing import Dict, List, Literal, Any
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 
 # --- 1. SETUP LOGGER ---
@@ -15,7 +19,7 @@ logger = setup_logger("API_Agent")
 from langchain.tools import tool
 from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage
 from langgraph.graph import MessagesState, StateGraph, START, END
-from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
 from langchain_core.runnables import RunnableConfig
 
 # --- IMPORT MODEL ---
@@ -29,6 +33,21 @@ except ImportError:
 DB_PATH = "housing.db"
 TABLE_NAME = "housing_data"
 
+# One long-lived connection per database (same pattern as tools_db.py):
+# connecting per call pays syscalls + a cold page cache every time, while a
+# shared WAL connection behind a lock keeps the cache hot across requests.
+_CONN_LOCK = threading.Lock()
+
+@lru_cache(maxsize=4)
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA cache_size=-64000;")      # 64 MB page cache
+    conn.execute("PRAGMA mmap_size=268435456;")    # 256 MB mmap
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    return conn
+
 # --- 2. HELPER FUNCTIONS ---
 def clean_response_content(content: Any) -> str:
     """
@@ -48,13 +67,16 @@ def clean_response_content(content: Any) -> str:
     # Case B: It's already a string
     return str(content)
 
+@lru_cache(maxsize=1)
 def load_metric_groups():
     try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql("SELECT json_data FROM ai_groups WHERE key='main_grouping'", conn)
-        conn.close()
-        if not df.empty:
-            return json.loads(df.iloc[0]['json_data'])
+        # Raw cursor: one row of JSON doesn't justify a DataFrame build
+        with _CONN_LOCK:
+            row = _connect(DB_PATH).execute(
+                "SELECT json_data FROM ai_groups WHERE key='main_grouping'"
+            ).fetchone()
+        if row:
+            return json.loads(row[0])
     except Exception as e:
         logger.warning(f"Could not load groupings: {e}")
     return {"General": []}
@@ -73,28 +95,31 @@ def execute_read_query(query: str):
     """Executes a SELECT query on 'housing_data'."""
     logger.info(f"Tool Triggered: execute_read_query | SQL: {query}")
     try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        row_count = len(df)
+        inner = query.rstrip().rstrip(";")
+        with _CONN_LOCK:
+            conn = _connect(DB_PATH)
+            # Count in SQL and cap the fetch at 20 rows — the old code pulled
+            # the full result into pandas just to slice it with .head(20)
+            row_count = conn.execute(f"SELECT COUNT(*) FROM ({inner})").fetchone()[0]
+            df = pd.read_sql_query(f"SELECT * FROM ({inner}) LIMIT 20", conn)
+
         logger.info(f"SQL Success. Retrieved {row_count} rows.")
-        
+
+        # CSV instead of to_string: no per-cell width computation, and fewer
+        # tokens for the model to chew through
         if row_count > 20:
-            return f"Result (First 20 of {row_count} rows):\n{df.head(20).to_string(index=False)}"
-        return df.to_string(index=False)
+            return f"Result (First 20 of {row_count} rows):\n{df.to_csv(index=False)}"
+        return df.to_csv(index=False)
     except Exception as e:
         logger.error(f"SQL Error: {e}")
         return f"SQL Error: {e}"
 
 # --- 4. GRAPH SETUP ---
+@lru_cache(maxsize=32)
 def get_columns(db_path, table_name):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(f"PRAGMA table_info({table_name})")
-    cols = [row[1] for row in cursor.fetchall()]
-    conn.close()
-    return cols
+    with _CONN_LOCK:
+        cursor = _connect(db_path).execute(f"PRAGMA table_info({table_name})")
+        return [row[1] for row in cursor.fetchall()]
 
 columns = get_columns(DB_PATH, TABLE_NAME)
 
@@ -114,8 +139,22 @@ tools = [execute_read_query, get_housing_context]
 tools_by_name = {tool.name: tool for tool in tools}
 llm_with_tools = model.bind_tools(tools)
 
+# Cap how much history is re-sent each turn (same rationale as backend.py:
+# without a window, per-session token cost grows quadratically).
+HISTORY_WINDOW = 10
+
+def trim_history(messages):
+    """Keeps the last HISTORY_WINDOW messages without splitting a tool exchange."""
+    if len(messages) <= HISTORY_WINDOW:
+        return messages
+    trimmed = messages[-HISTORY_WINDOW:]
+    # Never start the window on a tool result whose tool call was cut off.
+    while trimmed and isinstance(trimmed[0], ToolMessage):
+        trimmed = trimmed[1:]
+    return trimmed
+
 def llm_call(state: MessagesState):
-    return {"messages": [llm_with_tools.invoke([SystemMessage(content=housing_agent_prompt)] + state["messages"])]}
+    return {"messages": [llm_with_tools.invoke([SystemMessage(content=housing_agent_prompt)] + trim_history(state["messages"]))]}
 
 def tool_node(state: MessagesState):
     result = []
@@ -136,11 +175,18 @@ agent_builder.add_edge(START, "llm_call")
 agent_builder.add_conditional_edges("llm_call", should_continue, ["tool_node", END])
 agent_builder.add_edge("tool_node", "llm_call")
 
-checkpointer = InMemorySaver()
+# SQLite-backed checkpoints (same as backend.py): conversation state
+# survives restarts, stays bounded, and is shared across uvicorn workers —
+# InMemorySaver pinned every thread_id to a single process.
+CHECKPOINT_DB = "metadata_checkpoints.db"
+_checkpoint_conn = sqlite3.connect(CHECKPOINT_DB, check_same_thread=False)
+_checkpoint_conn.execute("PRAGMA journal_mode=WAL;")
+
+checkpointer = SqliteSaver(_checkpoint_conn)
 agent = agent_builder.compile(checkpointer=checkpointer)
 
 # --- 5. FASTAPI APP ---
-app = FastAPI(title="Housing Data Agent API")
+app = FastAPI(title="Housing Data Agent API", default_response_class=ORJSONResponse)
 
 class ChatRequest(BaseModel):
     message: str
@@ -157,16 +203,17 @@ async def log_requests(request: Request, call_next):
     return response
 
 @app.post("/chat", response_model=ChatResponse)
-def chat_endpoint(req: ChatRequest):
+async def chat_endpoint(req: ChatRequest):
     logger.info(f"Processing User Query: '{req.message}' (Thread: {req.thread_id})")
-    
+
     try:
         # 1. SETUP CONFIG
         config: RunnableConfig = {"configurable": {"thread_id": req.thread_id}}
-        
-        # 2. RUN AGENT (This was commented out before!)
+
+        # 2. RUN AGENT off the event loop — agent.invoke blocks on the LLM
+        # network call plus SQLite, which would stall every other request
         messages = [HumanMessage(content=req.message)]
-        result = agent.invoke({"messages": messages}, config)
+        result = await run_in_threadpool(agent.invoke, {"messages": messages}, config)
         
         # 3. CLEAN OUTPUT
         raw_content = result['messages'][-1].content
@@ -179,6 +226,31 @@ def chat_endpoint(req: ChatRequest):
         logger.error(f"Critical API Error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+def stream_agent_tokens(message: str, thread_id: str):
+    """Yields SSE events with answer text as the LLM produces it."""
+    config: RunnableConfig = {"configurable": {"thread_id": thread_id}}
+    for token, metadata in agent.stream(
+        {"messages": [HumanMessage(content=message)]}, config, stream_mode="messages"
+    ):
+        # Only forward text from the LLM node (skip tool output chunks)
+        if metadata.get("langgraph_node") != "llm_call":
+            continue
+        text = clean_response_content(token.content)
+        if text:
+            yield f"data: {json.dumps({'text': text})}\n\n"
+
+@app.post("/chat/stream")
+def chat_stream_endpoint(req: ChatRequest):
+    """
+    Streaming variant of /chat: tokens reach the client at the provider's
+    time-to-first-token instead of after the whole tool-use cycle.
+    """
+    logger.info(f"Streaming User Query: '{req.message}' (Thread: {req.thread_id})")
+    return StreamingResponse(
+        stream_agent_tokens(req.message, req.thread_id),
+        media_type="text/event-stream",
+    )
+
 if __name__ == "__main__":
     logger.info("--- SERVER STARTING ---")
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
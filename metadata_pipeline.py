@@ -1,8 +1,11 @@
+import asyncio
 import pandas as pd
 import sqlite3
 import os
+import re
 import sys
 import json
+import orjson
 import time
 
 # --- 1. IMPORT LOGGER ---
@@ -19,33 +22,168 @@ except ImportError:
     logger.critical("ERROR: Could not find 'config.py'")
     sys.exit()
 
+try:
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Optional columnar bulk-load path: ADBC ingests Arrow buffers directly,
+# skipping the per-cell Python serialization inside pandas' to_sql.
+try:
+    import adbc_driver_sqlite.dbapi as adbc
+    HAS_ADBC = HAS_PYARROW
+except ImportError:
+    HAS_ADBC = False
+
 # Configuration
 CSV_FILE = "housing.csv"
 DB_FILE = "housing.db"
 
+# Markdown fences around model JSON output, stripped in one compiled-regex
+# pass (same pattern as chatbot_agent.py's _MD_FENCE)
+_FENCE = re.compile(r"```(?:json)?\n?")
+
+def _parse_model_json(text: str):
+    return orjson.loads(_FENCE.sub("", text).strip())
+
 class ContextPipeline:
-    def get_stats(self, df, col_name):
-        series = df[col_name]
-        return {
-            "name": col_name,
-            "dtype": str(series.dtype),
-            "examples": list(series.dropna().unique()[:5])
-        }
+    def collect_stats(self, df):
+        """
+        Stats for every column in one pass: dtypes come from the frame header
+        and examples from a 64-row slice, instead of a full-column
+        dropna/unique scan per column.
+        """
+        sample = df.head(64)
+        dtypes = df.dtypes.astype(str).to_dict()
+        return [
+            {
+                "name": col,
+                "dtype": dtypes[col],
+                "examples": list(pd.unique(sample[col].dropna()))[:5],
+            }
+            for col in df.columns
+        ]
 
-    def generate_description(self, stats):
-        prompt = f"""
+    # Cap on concurrent in-flight LLM calls (provider RPM limits)
+    MAX_PARALLEL = 8
+
+    # Prompt builders keep the instruction block first and byte-identical
+    # across calls, with the variable fields last: providers that do implicit
+    # prefix caching can then reuse the processed prefix between columns.
+    def _build_description_prompt(self, stats):
+        return f"""
         Act as a Data Dictionary Expert.
+        Task: Write a 1-sentence description of the column below.
         Column: "{stats['name']}" (Type: {stats['dtype']})
         Examples: {stats['examples']}
-        Task: Write a 1-sentence description.
         """
+
+    def generate_description(self, stats):
         try:
-            response = model.invoke([HumanMessage(content=prompt)])
+            response = model.invoke([HumanMessage(content=self._build_description_prompt(stats))])
             return response.content.strip()
         except Exception as e:
             logger.warning(f" Failed to describe '{stats['name']}': {e}")
             return "Description unavailable."
 
+    async def _describe_async(self, stats, semaphore):
+        try:
+            async with semaphore:
+                response = await model.ainvoke(
+                    [HumanMessage(content=self._build_description_prompt(stats))]
+                )
+            return response.content.strip()
+        except Exception as e:
+            logger.warning(f" Failed to describe '{stats['name']}': {e}")
+            return "Description unavailable."
+
+    # Columns per prompt: amortizes the network hop and the repeated prompt
+    # prefix over many items; past ~16 the returns diminish.
+    BATCH = 12
+
+    def _build_batch_prompt(self, stats_list):
+        return f"""
+        Act as a Data Dictionary Expert.
+        Task: Return a JSON object (no markdown) mapping each column name
+        to a 1-sentence description.
+        Columns (name, type, examples): {json.dumps(stats_list, default=str)}
+        """
+
+    async def _describe_batch_async(self, stats_list, semaphore):
+        try:
+            async with semaphore:
+                response = await model.ainvoke(
+                    [HumanMessage(content=self._build_batch_prompt(stats_list))]
+                )
+            descriptions = _parse_model_json(response.content)
+            return [
+                str(descriptions.get(stats["name"], "Description unavailable.")).strip()
+                for stats in stats_list
+            ]
+        except Exception as e:
+            # Malformed JSON or a failed call: describe this chunk's columns
+            # individually rather than losing all of them
+            logger.warning(f"Batch describe failed ({e}); describing columns individually.")
+            return await asyncio.gather(
+                *(self._describe_async(stats, semaphore) for stats in stats_list)
+            )
+
+    def describe_columns(self, stats_list):
+        """
+        Describes all columns with chunked batch prompts run concurrently:
+        each prompt covers BATCH columns (one round-trip instead of BATCH),
+        and the chunks themselves overlap, bounded by MAX_PARALLEL.
+        """
+        async def _gather():
+            semaphore = asyncio.Semaphore(self.MAX_PARALLEL)
+            chunks = [
+                stats_list[i:i + self.BATCH]
+                for i in range(0, len(stats_list), self.BATCH)
+            ]
+            per_chunk = await asyncio.gather(
+                *(self._describe_batch_async(chunk, semaphore) for chunk in chunks)
+            )
+            return [desc for chunk in per_chunk for desc in chunk]
+        try:
+            return asyncio.run(_gather())
+        except Exception as e:
+            # e.g. a model wrapper without async support — fall back to the
+            # sequential path rather than failing the whole pipeline
+            logger.warning(f"Async describe failed ({e}); falling back to sequential.")
+            return [self.generate_description(stats) for stats in stats_list]
+
+    def generate_full_context(self, stats_list):
+        """
+        Descriptions AND grouping from one model call when the frame fits in
+        a single batch — the grouping prompt already needed every column
+        name, so fusing the two tasks drops a whole round-trip. Wide frames
+        keep the chunked describe path plus a separate grouping call.
+        """
+        names = [stats["name"] for stats in stats_list]
+        if len(stats_list) > self.BATCH:
+            return self.describe_columns(stats_list), self.generate_grouping_map(names)
+
+        prompt = f"""
+        Act as a Data Dictionary Expert.
+        Task: Return a JSON object (no markdown) of the form
+        {{"descriptions": {{<column name>: <1-sentence description>}},
+          "groups": {{<category name>: [<column names>]}}}}
+        using 3-5 logical categories for the groups.
+        Columns (name, type, examples): {json.dumps(stats_list, default=str)}
+        """
+        try:
+            response = model.invoke([HumanMessage(content=prompt)]).content
+            payload = _parse_model_json(response)
+            descriptions = [
+                str(payload["descriptions"].get(name, "Description unavailable.")).strip()
+                for name in names
+            ]
+            return descriptions, payload["groups"]
+        except Exception as e:
+            logger.warning(f"Fused describe+group failed ({e}); running the two phases separately.")
+            return self.describe_columns(stats_list), self.generate_grouping_map(names)
+
     def generate_grouping_map(self, columns):
         logger.info(f"AI is categorizing {len(columns)} columns...")
         
@@ -55,12 +193,37 @@ class ContextPipeline:
         """
         try:
             response = model.invoke([HumanMessage(content=prompt)]).content
-            clean_json = response.replace("```json", "").replace("```", "").strip()
-            return json.loads(clean_json)
+            return _parse_model_json(response)
         except Exception as e:
             logger.error(f"Error grouping columns: {e}")
             return {"General": columns}
 
+    def _save_housing_table(self, df):
+        """
+        Writes the full housing_data table. Prefers ADBC's Arrow-native bulk
+        ingest (columnar buffers, no per-cell Python loop); falls back to a
+        chunked multi-row to_sql inside one WAL transaction.
+        """
+        if HAS_ADBC:
+            try:
+                with adbc.connect(f"file:{DB_FILE}") as c, c.cursor() as cur:
+                    cur.adbc_ingest("housing_data", pa.Table.from_pandas(df), mode="replace")
+                    c.commit()
+                return
+            except Exception as e:
+                logger.warning(f"ADBC bulk load failed ({e}); falling back to to_sql.")
+
+        conn = sqlite3.connect(DB_FILE)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        # Multi-row INSERTs instead of one statement per row; chunk size stays
+        # under SQLite's 999-variable limit even for wide frames.
+        with conn:
+            df.to_sql("housing_data", conn, if_exists="replace", index=False,
+                      method="multi", chunksize=max(1, 900 // len(df.columns)))
+        conn.close()
+
     def run(self):
         logger.info("---  PIPELINE STARTED ---")
         
@@ -68,21 +231,23 @@ class ContextPipeline:
             logger.critical(f"File not found: {CSV_FILE}")
             return
 
-        logger.info(f"Loading {CSV_FILE}...")
-        df = pd.read_csv(CSV_FILE)
-        
+        # Two-phase read: phases 1-2 only need column names, dtypes and a few
+        # example values, so load just 64 rows up front. The full CSV is read
+        # only after the user approves the save — if they say "no", the big
+        # load never happens.
+        logger.info(f"Loading preview of {CSV_FILE}...")
+        preview = pd.read_csv(CSV_FILE, nrows=64)
+
         # --- PHASE 1: GENERATION (In Memory Only) ---
         metadata = []
-        logger.info(f"Analyzing {len(df.columns)} columns...")
-        
-        for col in df.columns:
-            stats = self.get_stats(df, col)
-            desc = self.generate_description(stats)
+        logger.info(f"Analyzing {len(preview.columns)} columns...")
+
+        stats_list = self.collect_stats(preview)
+        descriptions, grouping_map = self.generate_full_context(stats_list)
+        for col, desc in zip(preview.columns, descriptions):
             metadata.append({"column_name": col, "ai_description": desc})
             logger.info(f" Defined '{col}'")
 
-        grouping_map = self.generate_grouping_map(list(df.columns))
-
         # --- PHASE 2: THE "CATCH" (Review Step) ---
         print("\n" + "="*50)
         print("🕵️  REVIEW GENERATED CONTEXT BEFORE SAVING")
@@ -106,15 +271,39 @@ class ContextPipeline:
             return
 
         # --- PHASE 3: SAVING (Only if 'yes') ---
+        # Full load happens only now; the pyarrow engine parses the CSV with
+        # multithreaded columnar reads when available.
+        logger.info(f"Loading full {CSV_FILE}...")
+        if HAS_PYARROW:
+            df = pd.read_csv(CSV_FILE, engine="pyarrow")
+        else:
+            df = pd.read_csv(CSV_FILE)
+
         logger.info(f"Saving to {DB_FILE}...")
+        self._save_housing_table(df)
+
         conn = sqlite3.connect(DB_FILE)
-        
-        df.to_sql("housing_data", conn, if_exists="replace", index=False)
-        pd.DataFrame(metadata).to_sql("ai_context", conn, if_exists="replace", index=False)
-        
-        df_groups = pd.DataFrame([{"key": "main_grouping", "json_data": json.dumps(grouping_map)}])
-        df_groups.to_sql("ai_groups", conn, if_exists="replace", index=False)
-        
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+
+        # The metadata and groups tables are a handful of rows: plain
+        # executemany in one transaction, no DataFrame build or pandas
+        # schema inference, and a single fsync for both tables.
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS ai_context")
+            conn.execute("CREATE TABLE ai_context(column_name TEXT PRIMARY KEY, ai_description TEXT)")
+            conn.executemany(
+                "INSERT INTO ai_context VALUES(?,?)",
+                [(m["column_name"], m["ai_description"]) for m in metadata],
+            )
+            conn.execute("DROP TABLE IF EXISTS ai_groups")
+            conn.execute("CREATE TABLE ai_groups(key TEXT, json_data TEXT)")
+            conn.execute(
+                "INSERT INTO ai_groups VALUES(?,?)",
+                ("main_grouping", json.dumps(grouping_map)),
+            )
+
         conn.close()
         logger.info("PIPELINE COMPLETE successfully.")
 
@@ -35,11 +35,19 @@ try:
     
     # Connect (Creates file if missing)
     conn = sqlite3.connect(db_name)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
     cursor = conn.cursor()
-    
+
     # Write Data to Table 'heart_disease_info'
+    # method='multi' batches many rows per INSERT; the chunk size keeps each
+    # statement under SQLite's 999 bound-variable limit. `with conn:` commits
+    # the whole load as one transaction instead of one fsync per statement.
     table_name = "heart_disease_info"
-    df.to_sql(table_name, conn, if_exists='replace', index=False)
+    with conn:
+        df.to_sql(table_name, conn, if_exists='replace', index=False,
+                  method='multi', chunksize=max(1, 900 // len(df.columns)))
     print(f"✅ Data written to table '{table_name}'")
     
     # ==========================================
@@ -2,7 +2,8 @@ import streamlit as st
 import requests
 
 # Point this to where your FastAPI app is running
-API_URL = "http://localhost:8000/chat" 
+API_URL = "http://localhost:8000/chat"
+STREAM_API_URL = "http://localhost:8000/chat/stream"
 
 st.set_page_config(page_title="Heart Disease Assistant", page_icon="❤️")
 
@@ -52,22 +53,41 @@ def call_api(message: str, cfg_id: int) -> str:
         return f"⚠️ Error talking to backend: {e}"
 
 
-# ---------- Handle new input FIRST ----------
+def stream_api(message: str, cfg_id: int):
+    """Yield chatbot response chunks from the streaming endpoint as they arrive."""
+    resp = requests.post(
+        STREAM_API_URL,
+        json={"message": message, "config_id": cfg_id},
+        stream=True,
+        timeout=60,
+    )
+    resp.raise_for_status()
+    for chunk in resp.iter_content(chunk_size=None, decode_unicode=True):
+        if chunk:
+            yield chunk
+
+
+# ---------- Render chat history ONCE ----------
+for msg in st.session_state.messages:
+    with st.chat_message(msg["role"]):
+        st.markdown(msg["content"])
+
+
+# ---------- Handle new input (rendered live, below history) ----------
 user_input = st.chat_input("Type your question here...")
 
 if user_input:
-    # 1) store user message
+    # 1) show + store user message
+    st.chat_message("user").markdown(user_input)
     st.session_state.messages.append({"role": "user", "content": user_input})
 
-    # 2) call backend
-    with st.spinner("Thinking..."):
-        reply = call_api(user_input, st.session_state.current_config_id)
+    # 2) stream the reply token-by-token instead of waiting for the full answer
+    with st.chat_message("assistant"):
+        try:
+            reply = st.write_stream(stream_api(user_input, st.session_state.current_config_id))
+        except Exception as e:
+            reply = f"⚠️ Error talking to backend: {e}"
+            st.markdown(reply)
 
     # 3) store assistant reply
-    st.session_state.messages.append({"role": "assistant", "content": reply})
-
-
-# ---------- Render chat history ONCE ----------
-for msg in st.session_state.messages:
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
\ No newline at end of file
+    st.session_state.messages.append({"role": "assistant", "content": reply})
\ No newline at end of file
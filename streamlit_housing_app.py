@@ -1,12 +1,33 @@
 import streamlit as st
-import requests
+import httpx
 import json
 import pandas as pd
+from dataclasses import dataclass
 
 # --- CONFIGURATION ---
-AGENT_API_URL = "http://localhost:8001/chat"
+AGENT_API_URL = "http://localhost:8001"
 st.set_page_config(page_title="Housing Agent", page_icon="🏠", layout="wide")
 
+@st.cache_resource
+def get_client() -> httpx.Client:
+    # One keep-alive client for the whole app: each turn reuses the open
+    # socket to the agent instead of paying a fresh TCP connect per request
+    return httpx.Client(
+        base_url=AGENT_API_URL,
+        timeout=60.0,
+        limits=httpx.Limits(max_keepalive_connections=4),
+    )
+
+# Slotted message record: fixed attributes instead of a dict per message,
+# and the render loop branches on `kind` rather than isinstance probing
+@dataclass(slots=True)
+class Msg:
+    role: str
+    kind: str                # "text" | "chart"
+    text: str | None = None
+    spec: dict | None = None
+    values: list | None = None
+
 # --- SESSION STATE ---
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -28,48 +49,60 @@ with st.sidebar:
 # --- MAIN CHAT INTERFACE ---
 st.title("🤖 AI Real Estate Analyst")
 
-# Display History
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        # Check if content is JSON (Chart) or Text
-        if isinstance(message["content"], dict):
-            # It's a Chart!
-            st.vega_lite_chart(message["content"].get("data", {}).get("values", []), 
-                               message["content"], 
-                               use_container_width=True)
-        else:
-            # It's Text
-            st.markdown(message["content"])
+# Display History — in a fragment so interactions scoped to it rerun just
+# this block instead of the whole script re-walking every prior message
+@st.fragment
+def render_history():
+    for message in st.session_state.messages:
+        with st.chat_message(message.role):
+            # Chart messages carry their extracted values precomputed at
+            # append time, so reruns don't re-walk the spec dict per message
+            if message.kind == "chart":
+                st.vega_lite_chart(message.values, message.spec,
+                                   use_container_width=True)
+            else:
+                st.markdown(message.text)
+
+render_history()
 
 # User Input
 if prompt := st.chat_input("Ask about housing data..."):
     # 1. Display User Message
     st.chat_message("user").markdown(prompt)
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    st.session_state.messages.append(Msg("user", "text", text=prompt))
 
-    # 2. Call Agent API
+    # 2. Call Agent API (SSE: tokens render as they arrive, so the wait is
+    # first-token latency instead of full generation time)
     try:
-        with st.spinner("Analyzing data..."):
-            response = requests.post(AGENT_API_URL, json={"message": prompt})
-            
-            if response.status_code == 200:
-                result = response.json().get("response")
-                
-                # Check if result is a Chart (JSON Dict) or Text
+        with get_client().stream("POST", "/chat/stream", json={"message": prompt}) as response:
+            if response.status_code != 200:
+                st.error(f"Error: {response.status_code}")
+            else:
+                charts = []  # filled if the agent answers with a Vega-Lite spec
+
+                def iter_tokens():
+                    for line in response.iter_lines():
+                        if not line.startswith("data: "):
+                            continue
+                        payload = json.loads(line[len("data: "):])
+                        if "chart" in payload:
+                            charts.append(payload["chart"])
+                        elif payload.get("text"):
+                            yield payload["text"]
+
                 with st.chat_message("assistant"):
-                    if isinstance(result, dict) and "$schema" in result:
+                    result = st.write_stream(iter_tokens())
+                    if charts:
+                        spec = charts[0]
+                        values = spec.get("data", {}).get("values", [])
                         st.success("📊 Chart Generated!")
-                        st.vega_lite_chart(result.get("data", {}).get("values", []), 
-                                           result, 
-                                           use_container_width=True)
-                        # Save chart to history as a dict
-                        st.session_state.messages.append({"role": "assistant", "content": result})
+                        st.vega_lite_chart(values, spec, use_container_width=True)
+                        # Values extracted once here; history replay reuses them
+                        st.session_state.messages.append(
+                            Msg("assistant", "chart", spec=spec, values=values)
+                        )
                     else:
-                        st.markdown(result)
-                        # Save text to history
-                        st.session_state.messages.append({"role": "assistant", "content": result})
-            else:
-                st.error(f"Error: {response.status_code} - {response.text}")
+                        st.session_state.messages.append(Msg("assistant", "text", text=result))
 
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         st.error("❌ Could not connect to Agent. Is 'chatbot_agent.py' running on Port 8001?")
\ No newline at end of file
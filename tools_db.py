@@ -1,70 +1,209 @@
+import orjson
+import queue
+import re
 import sqlite3
-from typing import List, Any
+import threading
+from cachetools import TTLCache
+from functools import lru_cache
+from typing import List
 from langchain.tools import tool
 
 # ✅ Single Source of Truth for Database Path
 DB_PATH = "heart.db"
 
+# One long-lived READ-ONLY connection per database file.
+# Opening a fresh sqlite3.connect() per helper/tool call pays connect +
+# page-cache warm-up every time; the data here is only ever read, so a
+# shared read-only connection (guarded by a lock for FastAPI threads) is safe.
+_CONN_LOCK = threading.Lock()
+
+# Engine-level guard: only reads are authorized. Unlike a startswith("SELECT")
+# check, this also rejects writes smuggled into multi-statement queries or CTEs.
+_READ_ONLY_OPS = (
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_PRAGMA,     # needed for our own table_info introspection
+    sqlite3.SQLITE_RECURSIVE,  # WITH RECURSIVE is still just a read
+)
+
+def _readonly_authorizer(op, *args):
+    return sqlite3.SQLITE_OK if op in _READ_ONLY_OPS else sqlite3.SQLITE_DENY
+
+def _new_readonly_conn(db_path: str) -> sqlite3.Connection:
+    # cached_statements: repeated tool queries (same SQL, different bound
+    # values) reuse the compiled statement instead of re-parsing
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True,
+                           check_same_thread=False, cached_statements=256)
+    conn.execute("PRAGMA query_only=ON;")
+    # Read-heavy workload: big page cache + mmap keep repeat queries
+    # memory-bound instead of disk-bound once the working set is warm.
+    conn.execute("PRAGMA cache_size=-64000;")      # 64 MB page cache
+    conn.execute("PRAGMA mmap_size=268435456;")    # 256 MB mmap
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    # Wait out a concurrent writer (e.g. setup_db.py re-seeding the file)
+    # instead of failing immediately with "database is locked"
+    conn.execute("PRAGMA busy_timeout=5000;")
+    conn.set_authorizer(_readonly_authorizer)
+    return conn
+
+@lru_cache(maxsize=4)
+def _connect_readonly(db_path: str) -> sqlite3.Connection:
+    return _new_readonly_conn(db_path)
+
+# Pool of read-only connections for the agent's query tool: WAL lets N
+# readers run in parallel, so concurrent tool calls scale to the pool size
+# instead of queueing behind the single shared connection above (which the
+# cheap cached schema helpers keep using).
+_READ_POOL_SIZE = 4
+
+@lru_cache(maxsize=4)
+def _read_pool(db_path: str) -> "queue.Queue[sqlite3.Connection]":
+    pool = queue.Queue(maxsize=_READ_POOL_SIZE)
+    for _ in range(_READ_POOL_SIZE):
+        pool.put(_new_readonly_conn(db_path))
+    return pool
+
 def get_db_connection() -> sqlite3.Connection:
-    """Creates and returns a connection to the SQLite database."""
-    return sqlite3.connect(DB_PATH)
+    """Returns the shared read-only connection to the SQLite database."""
+    return _connect_readonly(DB_PATH)
 
+@lru_cache(maxsize=8)
 def get_all_tables(db_path: str = DB_PATH) -> List[str]:
-    """Returns a list of all table names in the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return tables
+    """Returns a list of all table names in the database (cached)."""
+    with _CONN_LOCK:
+        cursor = _connect_readonly(db_path).execute(
+            "SELECT name FROM sqlite_master WHERE type='table';"
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+def introspect_schema(db_path: str = DB_PATH, sample_n: int = 1) -> List[tuple]:
+    """
+    Tables, columns and a sample row for every table in one pass on one
+    connection — a single lock hold and read snapshot instead of the 2N+1
+    round-trips of calling the individual helpers per table.
+    Returns [(table, columns, sample_rows), ...].
+    """
+    with _CONN_LOCK:
+        conn = _connect_readonly(db_path)
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table';"
+        )]
+        schema = []
+        for table in tables:
+            cols = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}");')]
+            samples = conn.execute(f'SELECT * FROM "{table}" LIMIT ?;', (sample_n,)).fetchall()
+            schema.append((table, cols, samples))
+        return schema
+
+def invalidate_schema_cache():
+    """Clears the cached schema helpers (call after reseeding the database)."""
+    for fn in (get_all_tables, get_columns, get_sample_rows):
+        fn.cache_clear()
 
+def _require_known_table(db_path: str, table_name: str) -> str:
+    """Whitelists an identifier against the actual schema before interpolation."""
+    if table_name not in get_all_tables(db_path):
+        raise ValueError(f"Unknown table: {table_name!r}")
+    return table_name
+
+@lru_cache(maxsize=8)
 def get_columns(db_path: str, table_name: str) -> List[str]:
-    """Returns a list of column names for a specific table."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(f"PRAGMA table_info({table_name});")
-    cols = [row[1] for row in cursor.fetchall()]
-    conn.close()
-    return cols
+    """Returns a list of column names for a specific table (cached)."""
+    # The table-valued pragma_table_info(?) would let the name bind, but its
+    # internal schema-reparse trips the read-only authorizer (it surfaces as
+    # SQLITE_UPDATE on sqlite_master), so whitelist + quote instead.
+    table = _require_known_table(db_path, table_name)
+    with _CONN_LOCK:
+        cursor = _connect_readonly(db_path).execute(f'PRAGMA table_info("{table}");')
+        return [row[1] for row in cursor.fetchall()]
 
+@lru_cache(maxsize=8)
 def get_sample_rows(db_path: str, table_name: str, n: int = 2) -> List[tuple]:
-    """Returns the first N rows of data to help the AI understand values."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(f"SELECT * FROM {table_name} LIMIT {n};")
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    """Returns the first N rows of data to help the AI understand values (cached)."""
+    # Table names can't be bound, so whitelist against the schema; the
+    # stable SQL text (only LIMIT binds) stays in the statement cache.
+    table = _require_known_table(db_path, table_name)
+    with _CONN_LOCK:
+        cursor = _connect_readonly(db_path).execute(
+            f'SELECT * FROM "{table}" LIMIT ?;', (n,)
+        )
+        return cursor.fetchall()
 
 # ==========================================
 # ACTUAL AI TOOLS (Decorated with @tool)
 # ==========================================
 
+# Cheap prefix test (no full-string .upper() copy) that admits CTEs; the
+# authorizer below remains the actual enforcement, this just gives the
+# model a clearer error than "not authorized" without compiling the SQL.
+_SELECT_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+# Agents re-issue identical SELECTs while reasoning ("first row of X",
+# schema peeks); serve repeats from a short-TTL cache of the serialized
+# result so they skip SQLite entirely. 60 s bounds staleness if the DB is
+# ever reseeded under a running process.
+_RESULT_CACHE: "TTLCache[str, str]" = TTLCache(maxsize=256, ttl=60)
+_RESULT_CACHE_LOCK = threading.Lock()
+
+def invalidate_result_cache():
+    """Clears cached query results (pair with invalidate_schema_cache)."""
+    with _RESULT_CACHE_LOCK:
+        _RESULT_CACHE.clear()
+
+# Unbounded SELECTs from the model would otherwise materialize whole tables
+# and ship them back as one giant prompt; cap rows server-side.
+_HAS_LIMIT = re.compile(r"\bLIMIT\s+\d+", re.IGNORECASE)
+_MAX_ROWS = 500
+_FETCH_CHUNK = 100
+
 @tool
 def execute_read_query(query: str) -> str:
     """
     Executes a read-only SQL query against the heart.db database.
     Input must be a valid SQL SELECT statement.
     """
-    clean_query = query.strip().upper()
-    
-    # Security: Prevent deletions or drops
-    if not clean_query.startswith("SELECT"):
-        return "Error: Only SELECT queries are allowed for safety."
-    
+    # Security: the connection's authorizer denies anything but reads at the
+    # engine level, so no Python-side string check (or .upper() copy) is needed.
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(query)
-        data = cursor.fetchall()
-        
-        # Get headers to make the output readable for the LLM
-        headers = [desc[0] for desc in cursor.description] if cursor.description else []
-        
-        conn.close()
+        if not _SELECT_RE.match(query):
+            return "Error: Only SELECT queries are allowed for safety."
+
+        with _RESULT_CACHE_LOCK:
+            cached = _RESULT_CACHE.get(query)
+        if cached is not None:
+            return cached
+
+        inner = query.rstrip().rstrip(";")
+        if not _HAS_LIMIT.search(inner):
+            inner = f"SELECT * FROM ({inner}) LIMIT {_MAX_ROWS}"
+
+        pool = _read_pool(DB_PATH)
+        conn = pool.get()
+        try:
+            cursor = conn.execute(inner)
+            # fetchmany keeps peak memory at one chunk even if the query's
+            # own LIMIT is huge; the row cap bounds what reaches the LLM
+            data = []
+            while chunk := cursor.fetchmany(_FETCH_CHUNK):
+                data.extend(chunk)
+                if len(data) >= _MAX_ROWS:
+                    data = data[:_MAX_ROWS]
+                    break
+
+            # Get headers to make the output readable for the LLM
+            headers = [desc[0] for desc in cursor.description] if cursor.description else []
+        finally:
+            pool.put(conn)
+
         print("hola , Hi I am triggered!!")
 
-        return f"Headers: {headers}\nData: {data}"
+        # Compact JSON serialized in C instead of Python tuple reprs: faster
+        # for multi-row results and fewer tokens for the model to read
+        result = orjson.dumps({"headers": headers, "rows": data}).decode()
+        with _RESULT_CACHE_LOCK:
+            _RESULT_CACHE[query] = result
+        return result
 
     except Exception as e:
         return f"Database Error: {e}"
\ No newline at end of file